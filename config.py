@@ -5,10 +5,14 @@ Simple configuration for document processing pipeline
 import os
 from pathlib import Path
 
+from shared_config import COLLECTION_NAME, COLLECTION_METADATA
+
 # Paths
 BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / "data" / "docs-sm"
 OUTPUT_DIR = BASE_DIR / "output"
+OCR_CACHE_DIR = OUTPUT_DIR / "ocr_cache"
+EMBEDDING_CACHE_PATH = OUTPUT_DIR / "embeddings.npz"
 
 # Document types (from folder structure)
 DOCUMENT_TYPES = [
@@ -26,6 +30,15 @@ ENTITY_PATTERNS = {
     'amount': r'\$\s*\d+\.?\d*',
 }
 
+# Processing settings
+MAX_WORKERS = os.cpu_count() or 1
+OCR_BATCH_SIZE = 50  # images per worker task
+OCR_MAX_DIMENSION = 2000  # longest image side fed to Tesseract, in pixels
+OCR_ADAPTIVE_THRESHOLD = True
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+EMBEDDING_BATCH_SIZE = 64
+STORE_BATCH_SIZE = 500  # documents per Chroma add
+QUERY_CACHE_SIZE = 128  # search query embeddings kept in memory
+
 # ChromaDB settings
 CHROMA_DB_PATH = BASE_DIR / "chroma_db"
-COLLECTION_NAME = "documents"
@@ -18,8 +18,8 @@ def demo():
     print(f"\nProcessed {len(results)} documents")
     for doc in results[:3]:
         print(f"  • {doc['filename']} ({doc['category']}) - {doc['word_count']} words")
-        if doc['entities']:
-            print(f"    Entities: {list(doc['entities'].keys())}")
+        if doc['entities_count']:
+            print(f"    Entity types: {doc['entities_count']}")
     
     # Search demo
     print("\n2. Search examples:")
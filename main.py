@@ -2,17 +2,79 @@
 Simple Document Processing Pipeline - Main Script
 """
 
-import json
-import pandas as pd
-from datetime import datetime
+import csv
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
 from tqdm import tqdm
 import chromadb
+import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
 
 from config import *
 from utils import *
 
+# Columns of output/summary.csv
+SUMMARY_FIELDS = [
+    'filename', 'category', 'word_count', 'entities_count',
+    'has_email', 'has_phone', 'has_date', 'has_amount'
+]
+
+
+def build_document(file_info, text, timestamp):
+    """Turn raw OCR text into a document record"""
+    # Clean text
+    cleaned_text = clean_text(text)
+    
+    # Extract entities
+    entities = extract_entities(text)
+    
+    # Create document data
+    return {
+        'id': f"{file_info['category']}_{file_info['filename']}",
+        'filename': file_info['filename'],
+        'category': file_info['category'],
+        'text': cleaned_text,
+        'entities': entities,
+        'word_count': len(cleaned_text.split()),
+        'timestamp': timestamp
+    }
+
+
+def process_single_document(file_info, timestamp=None):
+    """Process a single document (module level so worker processes can run it)"""
+    try:
+        # Extract text using OCR
+        text = extract_text_from_image(file_info['path'])
+        if not text:
+            return None
+        
+        if timestamp is None:
+            timestamp = datetime.now(timezone.utc).isoformat()
+        return build_document(file_info, text, timestamp)
+        
+    except Exception as e:
+        print(f"Error processing {file_info['filename']}: {e}")
+        return None
+
+
+def process_document_batch(files, timestamp):
+    """Process a chunk of documents in one worker task"""
+    texts = extract_text_batch([file_info['path'] for file_info in files])
+    
+    documents = []
+    for file_info, text in zip(files, texts):
+        if not text:
+            continue
+        try:
+            documents.append(build_document(file_info, text, timestamp))
+        except Exception as e:
+            print(f"Error processing {file_info['filename']}: {e}")
+    
+    return documents
+
 
 class DocumentPipeline:
     """Simple document processing pipeline"""
@@ -20,87 +82,153 @@ class DocumentPipeline:
     def __init__(self):
         # Initialize ChromaDB
         self.client = chromadb.PersistentClient(path=str(CHROMA_DB_PATH))
-        self.collection = self._get_or_create_collection()
+        self.collection = self.client.get_or_create_collection(
+            name=COLLECTION_NAME, metadata=COLLECTION_METADATA
+        )
+        
+        # Initialize embedding model, in half precision on GPU
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.embedder = SentenceTransformer(EMBEDDING_MODEL, device=device)
+        if device == 'cuda':
+            self.embedder.half()
+        
+        # Document embeddings by text digest, filled from disk by process_documents;
+        # only the digests used by the current run are written back
+        self._embedding_cache = {}
+        self._embedding_digests_used = set()
         
-        # Initialize embedding model
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
+        # Repeated searches reuse the query embedding instead of re-encoding
+        self._embed_query = functools.lru_cache(maxsize=QUERY_CACHE_SIZE)(self._encode_query)
         
         print("Pipeline initialized")
     
-    def _get_or_create_collection(self):
-        """Get or create ChromaDB collection"""
-        try:
-            return self.client.get_collection(COLLECTION_NAME)
-        except:
-            return self.client.create_collection(COLLECTION_NAME)
+    def _encode(self, texts):
+        """Embed a list of texts as a normalized float32 numpy array"""
+        embeddings = self.embedder.encode(
+            texts,
+            batch_size=EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        # The half-precision GPU model returns float16; store and cache float32 only
+        return embeddings.astype(np.float32, copy=False)
+    
+    def _embed_documents(self, texts):
+        """Embed document texts, encoding only those not already cached"""
+        digests = [text_digest(text, salt=EMBEDDING_MODEL) for text in texts]
+        self._embedding_digests_used.update(digests)
+        missing = [i for i, digest in enumerate(digests) if digest not in self._embedding_cache]
+        
+        if missing:
+            embeddings = self._encode([texts[i] for i in missing])
+            for i, embedding in zip(missing, embeddings):
+                self._embedding_cache[digests[i]] = embedding
+        
+        return np.stack([self._embedding_cache[digest] for digest in digests])
+    
+    def _encode_query(self, query):
+        """Embed a search query as a read-only (1, dim) array"""
+        embedding = self._encode([query])
+        embedding.setflags(write=False)  # cached and shared between calls
+        return embedding
     
     def process_single_document(self, file_info):
         """Process a single document"""
-        try:
-            # Extract text using OCR
-            text = extract_text_from_image(file_info['path'])
-            if not text:
-                return None
-            
-            # Clean text
-            cleaned_text = clean_text(text)
-            
-            # Extract entities
-            entities = extract_entities(text)
-            
-            # Create document data
-            doc_data = {
-                'id': f"{file_info['category']}_{file_info['filename']}",
-                'filename': file_info['filename'],
-                'category': file_info['category'],
-                'text': cleaned_text,
-                'entities': entities,
-                'word_count': len(cleaned_text.split()),
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            return doc_data
-            
-        except Exception as e:
-            print(f"Error processing {file_info['filename']}: {e}")
-            return None
+        return process_single_document(file_info)
     
-    def process_documents(self, limit=50):
-        """Process multiple documents"""
-        print(f"Processing up to {limit} documents...")
-        
+    def iter_documents(self, limit=50):
+        """Process documents in parallel, yielding each one as it is ready"""
         # Get document files
         files = get_document_files(DATA_DIR, limit)
         print(f"Found {len(files)} files")
         
-        # Process documents
-        processed_docs = []
-        for file_info in tqdm(files, desc="Processing"):
-            doc_data = self.process_single_document(file_info)
-            if doc_data:
-                processed_docs.append(doc_data)
+        # Split files into OCR batches, small enough to keep every worker busy
+        batch_size = max(1, min(OCR_BATCH_SIZE, -(-len(files) // MAX_WORKERS)))
+        batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+        
+        # Documents of one run share a single timestamp
+        process_batch = functools.partial(
+            process_document_batch, timestamp=datetime.now(timezone.utc).isoformat()
+        )
+        
+        # Process batches in parallel; each worker keeps its own Tesseract API
+        with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor, \
+                tqdm(total=len(files), desc="Processing") as progress:
+            for batch, documents in zip(batches, executor.map(process_batch, batches)):
+                yield from documents
+                progress.update(len(batch))
+    
+    def process_documents(self, limit=50):
+        """
+        Process multiple documents, storing and saving them in batches.
         
-        print(f"Successfully processed {len(processed_docs)} documents")
+        Only one batch of full documents is held in memory at a time; the
+        returned list holds the lightweight summary row of each document.
+        The embedding cache is the exception: it keeps one vector per
+        document (about 1.5 KB each for all-MiniLM-L6-v2) until the run
+        ends, so it grows with the size of the dataset.
+        """
+        print(f"Processing up to {limit} documents...")
+        OUTPUT_DIR.mkdir(exist_ok=True)
         
-        # Only store if we have documents
-        if processed_docs:
-            # Store in vector database
-            self._store_documents(processed_docs)
+        # Reuse embeddings of texts already encoded by earlier runs
+        self._embedding_cache = load_embedding_cache(EMBEDDING_CACHE_PATH)
+        self._embedding_digests_used = set()
+        
+        summary = []
+        with open(OUTPUT_DIR / "results.jsonl", 'wb') as json_file, \
+                open(OUTPUT_DIR / "summary.csv", 'w', newline='') as csv_file:
+            csv_writer = csv.DictWriter(csv_file, fieldnames=SUMMARY_FIELDS)
+            csv_writer.writeheader()
             
-            # Save results
-            self._save_results(processed_docs)
-        else:
+            # Each batch is written to Chroma in the background while the
+            # next one is OCR'd and embedded; waiting on the previous write
+            # keeps at most two batches in flight
+            pending = None
+            with ThreadPoolExecutor(max_workers=1) as writer:
+                for batch in batched(self.iter_documents(limit), STORE_BATCH_SIZE):
+                    # Store in vector database
+                    stored = self._store_documents(batch, writer)
+                    
+                    # Save results
+                    summary.extend(self._save_results(batch, json_file, csv_writer))
+                    
+                    if pending:
+                        pending.result()
+                    pending = stored
+                
+                if pending:
+                    pending.result()
+        
+        # Keep only this run's vectors, so the cache tracks the dataset instead of
+        # growing forever, and vectors of a previous EMBEDDING_MODEL are dropped
+        save_embedding_cache(EMBEDDING_CACHE_PATH, {
+            digest: self._embedding_cache[digest] for digest in self._embedding_digests_used
+        })
+        self._embedding_cache = {}
+        self._embedding_digests_used = set()
+        
+        print(f"Successfully processed {len(summary)} documents")
+        
+        if not summary:
             print("⚠️ No documents were successfully processed")
             print("   Make sure Tesseract OCR is installed and in your PATH")
             return []
         
-        return processed_docs
+        print(f"Results saved to {OUTPUT_DIR}")
+        return summary
     
-    def _store_documents(self, documents):
-        """Store documents in ChromaDB"""
+    def _store_documents(self, documents, writer=None):
+        """
+        Store documents in ChromaDB.
+        
+        Documents are embedded right away. With a writer executor the add
+        runs on it and its future is returned; otherwise it runs inline.
+        """
         if not documents:
             print("⚠️ No documents to store")
-            return
+            return None
             
         print("💾 Storing in vector database...")
         
@@ -115,68 +243,71 @@ class DocumentPipeline:
                 'category': doc['category'],
                 'filename': doc['filename'],
                 'word_count': doc['word_count'],
-                'entities': json.dumps(doc['entities'])
+                'entities': to_json(doc['entities']).decode()
             })
         
-        # Generate embeddings and store
-        embeddings = self.embedder.encode(texts)
+        embeddings = self._embed_documents(texts)
         
-        self.collection.add(
-            ids=ids,
-            documents=texts,
-            embeddings=embeddings.tolist(),
-            metadatas=metadatas
-        )
+        def add():
+            self.collection.add(
+                ids=ids,
+                documents=texts,
+                embeddings=embeddings,
+                metadatas=metadatas
+            )
+            print(f"Stored {len(documents)} documents")
         
-        print(f"Stored {len(documents)} documents")
+        if writer is None:
+            add()
+            return None
+        return writer.submit(add)
     
-    def _save_results(self, documents):
-        """Save results to files"""
-        OUTPUT_DIR.mkdir(exist_ok=True)
-        
-        # Save as JSON
-        with open(OUTPUT_DIR / "results.json", 'w') as f:
-            json.dump(documents, f, indent=2)
-        
-        # Save as CSV
-        df_data = []
+    def _save_results(self, documents, json_file, csv_writer):
+        """Append documents to the JSONL results and the summary CSV"""
+        summary = []
         for doc in documents:
-            df_data.append({
+            json_file.write(to_json(doc) + b"\n")
+            
+            entities = doc['entities']
+            summary.append({
                 'filename': doc['filename'],
                 'category': doc['category'],
                 'word_count': doc['word_count'],
-                'entities_count': len(doc['entities']),
-                'has_email': 'email' in doc['entities'],
-                'has_phone': 'phone' in doc['entities'],
-                'has_date': 'date' in doc['entities'],
-                'has_amount': 'amount' in doc['entities']
+                'entities_count': len(entities),
+                'has_email': 'email' in entities,
+                'has_phone': 'phone' in entities,
+                'has_date': 'date' in entities,
+                'has_amount': 'amount' in entities
             })
         
-        df = pd.DataFrame(df_data)
-        df.to_csv(OUTPUT_DIR / "summary.csv", index=False)
-        
-        print(f"Results saved to {OUTPUT_DIR}")
+        csv_writer.writerows(summary)
+        return summary
     
     def search(self, query, n_results=5):
         """Search documents"""
-        query_embedding = self.embedder.encode([query])
+        query_embedding = self._embed_query(query)
         
         results = self.collection.query(
-            query_embeddings=query_embedding.tolist(),
+            query_embeddings=query_embedding,
             n_results=n_results
         )
         
-        search_results = []
-        for i in range(len(results['ids'][0])):
-            search_results.append({
-                'id': results['ids'][0][i],
-                'text': results['documents'][0][i][:200] + "...",
-                'category': results['metadatas'][0][i]['category'],
-                'filename': results['metadatas'][0][i]['filename'],
-                'similarity': 1 - results['distances'][0][i]
-            })
+        # Results come back as parallel per-query lists; we sent one query
+        ids = results['ids'][0]
+        documents = results['documents'][0]
+        metadatas = results['metadatas'][0]
+        distances = results['distances'][0]
         
-        return search_results
+        return [
+            {
+                'id': doc_id,
+                'text': document[:200] + "...",
+                'category': metadata['category'],
+                'filename': metadata['filename'],
+                'similarity': 1 - distance
+            }
+            for doc_id, document, metadata, distance in zip(ids, documents, metadatas, distances)
+        ]
     
     def get_stats(self):
         """Get simple statistics"""
@@ -4,6 +4,8 @@ Configuration constants for the document processor
 
 import os
 
+from shared_config import COLLECTION_NAME, COLLECTION_METADATA  # ChromaDB collection shared with main.py
+
 # Document categories based on the dataset structure
 DOCUMENT_CATEGORIES = [
     'advertisement',
@@ -23,6 +25,19 @@ DOCUMENT_CATEGORIES = [
     'scientific_report',
     'specification'
 ]
+DOCUMENT_CATEGORIES_SET = frozenset(DOCUMENT_CATEGORIES)
+
+# Keywords for text-based classification as (keyword, category) pairs;
+# the first matching pair wins, so earlier categories take priority
+CATEGORY_KEYWORDS = (
+    ('invoice', 'invoice'), ('bill', 'invoice'), ('payment', 'invoice'),
+    ('amount', 'invoice'), ('$', 'invoice'),
+    ('form', 'form'), ('application', 'form'), ('request', 'form'),
+    ('resume', 'resume'), ('cv', 'resume'), ('experience', 'resume'),
+    ('education', 'resume'),
+    ('letter', 'letter'), ('dear', 'letter'), ('sincerely', 'letter'),
+    ('memo', 'memo'), ('memorandum', 'memo'), ('subject:', 'memo'),
+)
 
 # Entity extraction patterns for different document types
 ENTITY_PATTERNS = {
@@ -59,4 +74,12 @@ CHROMA_DB_PATH = os.path.join(BASE_DIR, 'chroma_db')
 
 # Processing settings
 DEFAULT_LIMIT = 20
+MAX_THREADS = os.cpu_count() or 1  # worker threads for batch processing
+OCR_MAX_DIMENSION = 2000  # longest image side fed to Tesseract, in pixels
+NER_MODEL = 'dslim/bert-base-NER'  # BERT-base CoNLL03 tagger, ~3x smaller than BERT-large
+# Cached int8 ONNX export, one directory per model so changing NER_MODEL re-exports
+NER_ONNX_PATH = os.path.join(BASE_DIR, 'models', 'ner_int8', NER_MODEL.replace('/', '--'))
+NER_BATCH_SIZE = 32
+EMBEDDING_BATCH_SIZE = 64
+STORE_BATCH_SIZE = 200  # documents per ChromaDB add() call
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
@@ -0,0 +1,30 @@
+"""
+Django management command to build the quantized ONNX NER model.
+"""
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from processor.config import NER_MODEL
+from processor.pipeline import export_quantized_ner
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Export the NER model to int8 ONNX for faster CPU inference'
+
+    def handle(self, *args, **options):
+        """Main command handler."""
+        self.stdout.write(f'Exporting {NER_MODEL} to int8 ONNX...')
+        
+        try:
+            export_path = export_quantized_ner()
+        except Exception as e:
+            logger.exception('Error exporting the NER model')
+            raise CommandError(f'Export failed: {str(e)}')
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Quantized NER model saved to: {export_path}')
+        )
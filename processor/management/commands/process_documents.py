@@ -2,18 +2,22 @@
 Django management command to process documents from the dataset.
 """
 import os
+import heapq
 import logging
-from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Set, Tuple
 
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 
 from processor.pipeline import DocumentPipeline
+from processor.config import STORE_BATCH_SIZE
 
 
 logger = logging.getLogger(__name__)
 
+# Supported image extensions
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.tiff', '.tif', '.bmp'})
+
 
 class Command(BaseCommand):
     help = 'Process documents from the dataset directory'
@@ -54,15 +58,23 @@ class Command(BaseCommand):
             self.style.SUCCESS(f'Starting document processing from: {dataset_path}')
         )
         
-        if not os.path.exists(dataset_path):
+        # List category folders once; this doubles as the existence check
+        try:
+            with os.scandir(dataset_path) as entries:
+                category_dirs = sorted(
+                    (entry.name, entry.path) for entry in entries if entry.is_dir()
+                )
+        except FileNotFoundError:
             raise CommandError(f'Dataset path does not exist: {dataset_path}')
+        except NotADirectoryError:
+            raise CommandError(f'Dataset path is not a directory: {dataset_path}')
         
         try:
             # Initialize the pipeline
             pipeline = DocumentPipeline()
             
             # Get list of documents to process
-            documents = self._get_documents(dataset_path, category, limit)
+            documents = self._get_documents(category_dirs, category, limit)
             
             if not documents:
                 self.stdout.write(
@@ -74,22 +86,29 @@ class Command(BaseCommand):
                 self.style.SUCCESS(f'Found {len(documents)} documents to process')
             )
             
+            # Fetch stored filenames once instead of querying per document
+            existing_filenames = self._get_existing_filenames(pipeline) if skip_existing else set()
+            
             # Process documents
             processed_count = 0
             error_count = 0
             
+            # Documents are stored in ChromaDB in batches, not one per add()
+            pending = []
+            
             for doc_info in documents:
                 try:
                     # Check if document already exists
-                    if skip_existing and self._document_exists(pipeline, doc_info['path']):
+                    if doc_info['name'] in existing_filenames:
                         self.stdout.write(f'Skipping existing: {doc_info["name"]}')
                         continue
                     
                     # Process the document
-                    result = pipeline.process_single_document(doc_info['path'])
+                    result = pipeline.process_single_document(doc_info['path'], store=False)
                     
                     if result is not None:
                         processed_count += 1
+                        pending.append(result)
                         self.stdout.write(
                             self.style.SUCCESS(
                                 f'✓ Processed: {doc_info["name"]} '
@@ -110,6 +129,17 @@ class Command(BaseCommand):
                     self.stdout.write(
                         self.style.ERROR(f'✗ Error: {doc_info["name"]} - {str(e)}')
                     )
+                
+                if len(pending) >= STORE_BATCH_SIZE:
+                    stored = self._store_batch(pipeline, pending)
+                    processed_count -= len(pending) - stored
+                    error_count += len(pending) - stored
+                    pending = []
+            
+            if pending:
+                stored = self._store_batch(pipeline, pending)
+                processed_count -= len(pending) - stored
+                error_count += len(pending) - stored
             
             # Print summary
             self.stdout.write('\n' + '='*50)
@@ -135,67 +165,74 @@ class Command(BaseCommand):
             logger.exception('Error in document processing command')
             raise CommandError(f'Command failed: {str(e)}')
 
-    def _get_documents(self, dataset_path: str, category: str = None, limit: int = None) -> List[Dict[str, Any]]:
-        """Get list of documents to process."""
-        documents = []
-        dataset_path = Path(dataset_path)
+    def _get_documents(self, category_dirs: List[Tuple[str, str]], category: str = None,
+                       limit: int = None) -> List[Dict[str, Any]]:
+        """
+        Get list of documents to process.
         
-        # Supported image extensions
-        image_extensions = {'.jpg', '.jpeg', '.png', '.tiff', '.tif', '.bmp'}
+        category_dirs holds (name, path) pairs of the dataset's category
+        folders, sorted by name so a limit can stop the walk early.
+        """
+        documents = []
+        limit = limit if limit and limit > 0 else None
         
         if category:
             # Process only specific category
-            category_path = dataset_path / category
-            if not category_path.exists():
+            category_dirs = [(name, path) for name, path in category_dirs if name == category]
+            if not category_dirs:
                 self.stdout.write(
-                    self.style.WARNING(f'Category path does not exist: {category_path}')
+                    self.style.WARNING(f'Category not found in dataset: {category}')
                 )
                 return documents
-            
-            for file_path in category_path.iterdir():
-                if file_path.is_file() and file_path.suffix.lower() in image_extensions:
-                    documents.append({
-                        'path': str(file_path),
-                        'name': file_path.name,
-                        'category': category
-                    })
-        else:
-            # Process all categories
-            for category_dir in dataset_path.iterdir():
-                if category_dir.is_dir():
-                    category_name = category_dir.name
-                    
-                    for file_path in category_dir.iterdir():
-                        if file_path.is_file() and file_path.suffix.lower() in image_extensions:
-                            documents.append({
-                                'path': str(file_path),
-                                'name': file_path.name,
-                                'category': category_name
-                            })
         
-        # Sort by category and name for consistent processing
-        documents.sort(key=lambda x: (x['category'], x['name']))
-        
-        # Apply limit if specified
-        if limit and limit > 0:
-            documents = documents[:limit]
+        for category_name, category_path in category_dirs:
+            with os.scandir(category_path) as entries:
+                files = [
+                    (entry.name, entry.path) for entry in entries
+                    if entry.is_file()
+                    and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS
+                ]
+            
+            # Sort by name for consistent processing, keeping only what the limit allows
+            if limit:
+                files = heapq.nsmallest(limit - len(documents), files)
+            else:
+                files.sort()
+            
+            for name, path in files:
+                documents.append({
+                    'path': path,
+                    'name': name,
+                    'category': category_name
+                })
+            
+            if limit and len(documents) >= limit:
+                break
         
         return documents
 
-    def _document_exists(self, pipeline: DocumentPipeline, file_path: str) -> bool:
-        """Check if document already exists in the database."""
+    def _store_batch(self, pipeline: DocumentPipeline, documents: List[Dict[str, Any]]) -> int:
+        """Store processed documents in one batch; returns how many were stored."""
         try:
-            # Search for document by filename
-            filename = os.path.basename(file_path)
-            results = pipeline.search(filename, limit=1)
-            
-            # Check if any result has exactly matching filename
-            for result in results:
-                if result.get('metadata', {}).get('filename') == filename:
-                    return True
-            
-            return False
+            pipeline._store_documents(documents)
+            return len(documents)
+        except Exception as e:
+            logger.exception(f'Error storing a batch of {len(documents)} documents')
+            self.stdout.write(
+                self.style.ERROR(f'✗ Failed to store {len(documents)} documents - {str(e)}')
+            )
+            return 0
+
+    def _get_existing_filenames(self, pipeline: DocumentPipeline) -> Set[str]:
+        """Get the filenames of all documents already in the database."""
+        try:
+            results = pipeline.collection.get(include=['metadatas'])
+            return {
+                metadata['filename']
+                for metadata in results['metadatas']
+                if metadata and 'filename' in metadata
+            }
             
         except Exception as e:
-            logger.warning(f'Error checking if document exists: {str(e)}')
-            return False
+            logger.warning(f'Error fetching existing documents: {str(e)}')
+            return set()
@@ -4,25 +4,68 @@ Migrated from standalone main.py to Django app structure
 """
 
 import os
+import re
+import csv
 import json
+import shutil
 import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
 import chromadb
-import pandas as pd
 from sentence_transformers import SentenceTransformer
 from transformers import pipeline, AutoTokenizer, AutoModelForTokenClassification
 import torch
 from tqdm import tqdm
 
-from .utils import extract_text_from_image, clean_text, extract_entities, get_document_files
-from .config import ENTITY_PATTERNS, DOCUMENT_CATEGORIES, CHROMA_DB_PATH, OUTPUT_PATH
+try:
+    import orjson
+except ImportError:  # stdlib fallback, several times slower
+    orjson = None
+
+try:
+    from optimum.onnxruntime import ORTModelForTokenClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+except ImportError:  # optional; without it NER runs on the PyTorch model
+    ORTModelForTokenClassification = None
+
+from .utils import (
+    extract_text_from_image, extract_text_from_bytes, clean_text, extract_entities, get_document_files,
+    build_prefilter, build_keyword_matcher
+)
+from .config import (
+    DOCUMENT_CATEGORIES_SET, CATEGORY_KEYWORDS, CHROMA_DB_PATH, OUTPUT_PATH, NER_ONNX_PATH,
+    COLLECTION_NAME, COLLECTION_METADATA,
+    MAX_THREADS, NER_MODEL, NER_BATCH_SIZE, EMBEDDING_BATCH_SIZE, STORE_BATCH_SIZE
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Regexes complementing the NER model, compiled once at import
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+_PHONE_RE = re.compile(r'\b(?:\+?1[-.\s]?)?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})\b')
+_MONEY_RE = re.compile(r'\$\s*\d+(?:,\d{3})*(?:\.\d{2})?')
+_REGEX_PREFILTER = build_prefilter({'emails': _EMAIL_RE, 'phones': _PHONE_RE, 'amounts': _MONEY_RE})
+
+
+def _may_contain_names(text: str) -> bool:
+    """
+    Cheap check for text the cased NER model could find entities in
+    
+    PER/ORG/LOC/MISC spans practically always start with a capital, so
+    text without any uppercase character skips the model.
+    """
+    return text.lower() != text
+
+
+# All classification keywords matched in one pass, when pyahocorasick is available
+_CATEGORY_MATCHER = build_keyword_matcher(CATEGORY_KEYWORDS)
+
 
 class DocumentPipeline:
     """Main document processing pipeline"""
@@ -31,19 +74,32 @@ class DocumentPipeline:
         """Initialize the pipeline with all required components"""
         # Initialize ChromaDB
         self.client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-        self.collection = self.client.get_or_create_collection("documents")
+        self.collection = self.client.get_or_create_collection(
+            name=COLLECTION_NAME, metadata=COLLECTION_METADATA
+        )
         
-        # Initialize sentence transformer for embeddings
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
+        # Initialize sentence transformer for embeddings; the pipeline is
+        # shared between request threads, so encoding is serialized too
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.embedder = SentenceTransformer('all-MiniLM-L6-v2', device=device)
+        if device == 'cuda':
+            self.embedder.half()
+        self._embed_lock = threading.Lock()
         
-        # Initialize NER pipeline for entity extraction
+        # Initialize NER pipeline for entity extraction; its tokenizer must
+        # not be called from several threads at once
+        self._ner_lock = threading.Lock()
         try:
-            self.ner_pipeline = pipeline(
-                "ner", 
-                model="dbmdz/bert-large-cased-finetuned-conll03-english",
-                aggregation_strategy="simple",
-                device=0 if torch.cuda.is_available() else -1
-            )
+            self.ner_pipeline = None
+            if not torch.cuda.is_available():
+                self.ner_pipeline = self._load_quantized_ner()
+            if self.ner_pipeline is None:
+                self.ner_pipeline = pipeline(
+                    "ner", 
+                    model=NER_MODEL,
+                    aggregation_strategy="simple",
+                    device=0 if torch.cuda.is_available() else -1
+                )
             logger.info("NER pipeline initialized")
         except Exception as e:
             logger.warning(f"Failed to initialize NER pipeline: {e}")
@@ -52,11 +108,77 @@ class DocumentPipeline:
         logger.info("Pipeline initialized")
     
     
-    def process_single_document(self, file_path: str) -> Optional[Dict[str, Any]]:
-        """Process a single document and return structured data"""
+    def _load_quantized_ner(self):
+        """
+        Load the int8 ONNX Runtime version of the NER model for CPU inference
+        
+        Only an existing export is loaded; it is built ahead of time with
+        `manage.py export_ner_model` (see export_quantized_ner). Returns None
+        when optimum is not installed, no export exists or loading fails,
+        in which case the PyTorch model is used.
+        """
+        if ORTModelForTokenClassification is None:
+            return None
+        if not os.path.isdir(NER_ONNX_PATH):
+            logger.info("No quantized NER export found; run `manage.py export_ner_model` to build one")
+            return None
+        
+        try:
+            model = ORTModelForTokenClassification.from_pretrained(
+                NER_ONNX_PATH, file_name="model_quantized.onnx"
+            )
+            return pipeline(
+                "ner",
+                model=model,
+                tokenizer=AutoTokenizer.from_pretrained(NER_ONNX_PATH),
+                aggregation_strategy="simple"
+            )
+        except Exception as e:
+            logger.warning(f"Quantized NER unavailable, using PyTorch model: {e}")
+            return None
+    
+    def process_single_document(self, file_path: str, store: bool = True,
+                                content: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
+        """
+        Process a single document and return structured data
+        
+        With store=False the document is not written to ChromaDB, so the
+        caller can store many documents in one batch. When content holds
+        the encoded image, it is decoded from memory and file_path only
+        names the document. Such in-memory documents get a unique id, as
+        different uploads often share a client filename.
+        """
+        doc_data = self._prepare_document(file_path, content)
+        if doc_data is None:
+            return None
+        
+        try:
+            # Extract entities using LLM-based NER
+            doc_data['entities'] = self._extract_entities_with_llm(doc_data['text'], doc_data['category'])
+
+            # Store the document in ChromaDB
+            if store:
+                self._store_documents([doc_data])
+
+            return doc_data
+
+        except Exception as e:
+            logger.error(f"Error processing {file_path}: {str(e)}")
+            return None
+    
+    def _prepare_document(self, file_path: str, content: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
+        """
+        Run OCR, cleaning and classification for a document
+        
+        Entities are left empty so they can be filled in by a single
+        batched NER pass over many documents.
+        """
         try:
             # Extract text using OCR
-            text = extract_text_from_image(file_path)
+            if content is not None:
+                text = extract_text_from_bytes(content)
+            else:
+                text = extract_text_from_image(file_path)
 
             if not text or len(text.strip()) < 10:
                 return None
@@ -67,26 +189,21 @@ class DocumentPipeline:
             # Determine document category from file path or use classification
             category = self._classify_document(file_path, cleaned_text)
 
-            # Extract entities using LLM-based NER
-            entities = self._extract_entities_with_llm(cleaned_text, category)
-
             # Create document data structure
-            doc_data = {
-                'id': f"{category}_{os.path.basename(file_path)}",
+            doc_id = f"{category}_{os.path.basename(file_path)}"
+            if content is not None:
+                doc_id = f"{category}_{uuid.uuid4().hex}_{os.path.basename(file_path)}"
+            return {
+                'id': doc_id,
                 'filename': os.path.basename(file_path),
                 'file_path': file_path,
                 'category': category,
                 'text': cleaned_text,
-                'entities': entities,
+                'entities': {},
                 'word_count': len(cleaned_text.split()),
                 'timestamp': datetime.now().isoformat()
             }
 
-            # Store the document in ChromaDB
-            self._store_documents([doc_data])
-
-            return doc_data
-
         except Exception as e:
             logger.error(f"Error processing {file_path}: {str(e)}")
             return None
@@ -97,31 +214,27 @@ class DocumentPipeline:
         For now, uses folder structure. Can be enhanced with ML classification.
         """
         # Extract category from folder structure
-        path_parts = file_path.split(os.sep)
-        for part in path_parts:
-            if part in DOCUMENT_CATEGORIES:
+        for part in file_path.split(os.sep):
+            if part in DOCUMENT_CATEGORIES_SET:
                 return part
         
         # Fallback: simple text-based classification
         text_lower = text.lower()
-        
-        if any(word in text_lower for word in ['invoice', 'bill', 'payment', 'amount', '$']):
-            return 'invoice'
-        elif any(word in text_lower for word in ['form', 'application', 'request']):
-            return 'form'
-        elif any(word in text_lower for word in ['resume', 'cv', 'experience', 'education']):
-            return 'resume'
-        elif any(word in text_lower for word in ['letter', 'dear', 'sincerely']):
-            return 'letter'
-        elif any(word in text_lower for word in ['memo', 'memorandum', 'subject:']):
-            return 'memo'
-        else:
-            return 'unknown'
+        if _CATEGORY_MATCHER:
+            return _CATEGORY_MATCHER(text_lower) or 'unknown'
+        return next(
+            (category for word, category in CATEGORY_KEYWORDS if word in text_lower),
+            'unknown'
+        )
     
-    def _extract_entities_with_llm(self, text: str, document_type: str) -> Dict[str, List[str]]:
+    def _extract_entities_with_llm(self, text: str, document_type: str,
+                                   ner_results: Optional[List[Dict[str, Any]]] = None) -> Dict[str, List[str]]:
         """
         Extract entities using LLM-based NER pipeline
         Returns structured entities based on document type
+        
+        ner_results can carry the model output from a batched NER pass;
+        when omitted the model is run on this text alone.
         """
         entities = {
             'persons': [],
@@ -139,7 +252,13 @@ class DocumentPipeline:
         
         try:
             # Use the NER pipeline to extract entities
-            ner_results = self.ner_pipeline(text[:512])  # Limit text length for performance
+            if ner_results is None:
+                snippet = text[:512]  # Limit text length for performance
+                if _may_contain_names(snippet):
+                    with self._ner_lock:
+                        ner_results = self.ner_pipeline(snippet)
+                else:
+                    ner_results = []
             
             for entity in ner_results:
                 entity_type = entity['entity_group'].upper()
@@ -161,36 +280,35 @@ class DocumentPipeline:
                         elif any(char.isdigit() for char in entity_text):
                             entities['dates'].append(entity_text)
             
-            # Additional regex-based extraction for specific patterns
-            import re
+            # Additional regex-based extraction for specific patterns;
+            # the prefilter, when available, rules out non-matching ones
+            candidates = _REGEX_PREFILTER(text) if _REGEX_PREFILTER else None
             
             # Extract email addresses
-            email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-            emails = re.findall(email_pattern, text)
-            entities['emails'].extend(emails)
+            if candidates is None or 'emails' in candidates:
+                entities['emails'].extend(_EMAIL_RE.findall(text))
             
             # Extract phone numbers
-            phone_pattern = r'\b(?:\+?1[-.\s]?)?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})\b'
-            phones = re.findall(phone_pattern, text)
-            entities['phones'].extend(['-'.join(phone) for phone in phones])
+            if candidates is None or 'phones' in candidates:
+                phones = _PHONE_RE.findall(text)
+                entities['phones'].extend(['-'.join(phone) for phone in phones])
             
             # Extract monetary amounts
-            money_pattern = r'\$\s*\d+(?:,\d{3})*(?:\.\d{2})?'
-            amounts = re.findall(money_pattern, text)
-            entities['amounts'].extend(amounts)
+            if candidates is None or 'amounts' in candidates:
+                entities['amounts'].extend(_MONEY_RE.findall(text))
             
-            # Remove duplicates and clean up
+            # Remove duplicates and clean up, keeping first-seen order
             for key in entities:
-                entities[key] = list(set(entities[key]))
-                entities[key] = [item for item in entities[key] if len(item.strip()) > 1]
+                entities[key] = list(dict.fromkeys(
+                    item for item in entities[key] if len(item.strip()) > 1
+                ))
             
             logger.info(f"Extracted {sum(len(v) for v in entities.values())} entities using LLM")
             
         except Exception as e:
             logger.error(f"Error in LLM entity extraction: {e}")
             # Fallback to basic extraction
-            from .utils import extract_entities, ENTITY_PATTERNS
-            return extract_entities(text, ENTITY_PATTERNS)
+            return extract_entities(text)
         
         return entities
     
@@ -202,13 +320,20 @@ class DocumentPipeline:
         files = get_document_files(data_path)[:limit]
         logger.info(f"Found {len(files)} files")
         
-        processed_docs = []
+        # OCR, clean and classify in parallel; OCR and OpenCV release the GIL
+        with ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
+            results = executor.map(self._prepare_document, files)
+            processed_docs = [
+                doc_data for doc_data in tqdm(results, total=len(files), desc="Processing")
+                if doc_data
+            ]
         
-        # Process each file
-        for file_path in tqdm(files, desc="Processing"):
-            doc_data = self.process_single_document(file_path)
-            if doc_data:
-                processed_docs.append(doc_data)
+        # Extract entities with one batched NER pass over all documents
+        texts = [doc_data['text'] for doc_data in processed_docs]
+        for doc_data, ner_results in zip(processed_docs, self._run_ner_batch(texts)):
+            doc_data['entities'] = self._extract_entities_with_llm(
+                doc_data['text'], doc_data['category'], ner_results
+            )
         
         logger.info(f"Successfully processed {len(processed_docs)} documents")
         
@@ -222,6 +347,45 @@ class DocumentPipeline:
         
         return processed_docs
     
+    def _run_ner_batch(self, texts: List[str]) -> List[Optional[List[Dict[str, Any]]]]:
+        """
+        Run the NER model over many texts in batches
+        
+        Texts are sorted by length before batching so each batch pads to
+        similar lengths; results come back in the original order. Entries
+        are None when the batch could not be run, in which case
+        _extract_entities_with_llm runs the model per document.
+        """
+        if not self.ner_pipeline or not texts:
+            return [None] * len(texts)
+        
+        snippets = [text[:512] for text in texts]
+        results = [None] * len(texts)
+        
+        # Texts without capitals get no model entities; only regexes run on them
+        candidates = []
+        for i, snippet in enumerate(snippets):
+            if _may_contain_names(snippet):
+                candidates.append(i)
+            else:
+                results[i] = []
+        if not candidates:
+            return results
+        order = sorted(candidates, key=lambda i: len(snippets[i]))
+        
+        try:
+            with self._ner_lock:
+                sorted_results = self.ner_pipeline(
+                    [snippets[i] for i in order], batch_size=NER_BATCH_SIZE
+                )
+        except Exception as e:
+            logger.warning(f"Batched NER failed, falling back to per-document NER: {e}")
+            return [None] * len(texts)
+        
+        for i, ner_results in zip(order, sorted_results):
+            results[i] = ner_results
+        return results
+    
     def _store_documents(self, documents: List[Dict[str, Any]]):
         """Store documents in ChromaDB"""
         if not documents:
@@ -245,14 +409,27 @@ class DocumentPipeline:
             })
         
         # Generate embeddings and store
-        embeddings = self.embedder.encode(texts)
+        with self._embed_lock:
+            embeddings = self.embedder.encode(
+                texts,
+                batch_size=EMBEDDING_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
         
-        self.collection.add(
-            ids=ids,
-            documents=texts,
-            embeddings=embeddings.tolist(),
-            metadatas=metadatas
-        )
+        embeddings = embeddings.astype('float32', copy=False)
+        
+        # Add in fixed-size chunks; one huge add() spikes memory and stalls
+        # the HNSW index update, while per-document adds pay a transaction each
+        for start in range(0, len(ids), STORE_BATCH_SIZE):
+            end = start + STORE_BATCH_SIZE
+            self.collection.add(
+                ids=ids[start:end],
+                documents=texts[start:end],
+                embeddings=embeddings[start:end],
+                metadatas=metadatas[start:end]
+            )
         
         logger.info(f"Stored {len(documents)} documents")
     
@@ -262,23 +439,29 @@ class DocumentPipeline:
         
         # Save detailed results as JSON
         json_path = os.path.join(OUTPUT_PATH, 'results.json')
-        with open(json_path, 'w') as f:
-            json.dump(documents, f, indent=2)
+        if orjson is not None:
+            with open(json_path, 'wb') as f:
+                f.write(orjson.dumps(documents, option=orjson.OPT_INDENT_2))
+        else:
+            with open(json_path, 'w') as f:
+                json.dump(documents, f, indent=2)
         
         # Create summary CSV
-        summary_data = []
-        for doc in documents:
-            summary_data.append({
+        csv_path = os.path.join(OUTPUT_PATH, 'summary.csv')
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(
+                f,
+                fieldnames=['filename', 'category', 'word_count', 'entity_count', 'timestamp'],
+                lineterminator='\n'
+            )
+            writer.writeheader()
+            writer.writerows({
                 'filename': doc['filename'],
                 'category': doc['category'],
                 'word_count': doc['word_count'],
                 'entity_count': len(doc['entities']),
                 'timestamp': doc['timestamp']
-            })
-        
-        df = pd.DataFrame(summary_data)
-        csv_path = os.path.join(OUTPUT_PATH, 'summary.csv')
-        df.to_csv(csv_path, index=False)
+            } for doc in documents)
         
         logger.info(f"Results saved to {OUTPUT_PATH}")
     
@@ -334,3 +517,60 @@ class DocumentPipeline:
         except Exception as e:
             logger.error(f"Stats error: {str(e)}")
             return {'total_documents': 0, 'categories': {}, 'error': str(e)}
+
+
+def export_quantized_ner() -> str:
+    """
+    Export NER_MODEL to ONNX with dynamic int8 quantization (VNNI kernels)
+    
+    Takes minutes, so it runs ahead of time rather than on pipeline
+    startup. The export is built in a sibling directory and renamed to
+    NER_ONNX_PATH, so an interrupted export never leaves a half-written
+    cache behind. An existing export is first renamed aside and deleted
+    only afterwards; directories cannot be swapped atomically, so the
+    path is missing just between the two renames. Returns NER_ONNX_PATH.
+    """
+    if ORTModelForTokenClassification is None:
+        raise RuntimeError("optimum[onnxruntime] is not installed")
+    
+    logger.info(f"Exporting {NER_MODEL} to int8 ONNX in {NER_ONNX_PATH}...")
+    build_path = f"{NER_ONNX_PATH}.tmp"
+    old_path = f"{NER_ONNX_PATH}.old"
+    # Left over from an interrupted export
+    shutil.rmtree(build_path, ignore_errors=True)
+    shutil.rmtree(old_path, ignore_errors=True)
+    model = ORTModelForTokenClassification.from_pretrained(NER_MODEL, export=True)
+    quantizer = ORTQuantizer.from_pretrained(model)
+    quantizer.quantize(
+        save_dir=build_path,
+        quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False)
+    )
+    model.config.save_pretrained(build_path)
+    AutoTokenizer.from_pretrained(NER_MODEL).save_pretrained(build_path)
+    
+    replacing = os.path.isdir(NER_ONNX_PATH)
+    if replacing:
+        os.rename(NER_ONNX_PATH, old_path)
+    os.rename(build_path, NER_ONNX_PATH)
+    if replacing:
+        shutil.rmtree(old_path, ignore_errors=True)
+    return NER_ONNX_PATH
+
+
+_pipeline: Optional[DocumentPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline() -> DocumentPipeline:
+    """
+    Return the process-wide DocumentPipeline, creating it on first use
+    
+    Loading the models and opening ChromaDB takes seconds, so API views
+    share one instance instead of building a pipeline per request.
+    """
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = DocumentPipeline()
+    return _pipeline
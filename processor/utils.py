@@ -5,39 +5,225 @@ Migrated from standalone utils.py
 
 import os
 import re
+import queue
+import string
+import atexit
+import threading
+from contextlib import contextmanager
+
+# One OMP thread per Tesseract API; parallelism comes from the thread pool
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
 import cv2
-import pytesseract
+from tesserocr import PyTessBaseAPI, PSM
 from PIL import Image
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Callable, Hashable, Set, Sequence, Tuple
+
+try:
+    import hyperscan
+except ImportError:  # optional; without it every regex is simply run
+    hyperscan = None
+
+try:
+    import ahocorasick
+except ImportError:  # optional; without it keywords are searched one by one
+    ahocorasick = None
+
+from .config import OCR_MAX_DIMENSION, ENTITY_PATTERNS
+
+
+# Regexes compiled once at import; flags are baked into each pattern
+_WHITESPACE_RE = re.compile(r'\s+')
+_SPECIAL_RE = re.compile(r'[^\w\s.,!?;:()\-$@]')
+
+# str.translate table doing _SPECIAL_RE's job on ASCII text after
+# whitespace collapsing, when only spaces are left as whitespace
+_ASCII_KEEP = frozenset(string.ascii_letters + string.digits + '_ .,!?;:()-$@')
+_ASCII_STRIP = {code: None for code in range(128) if chr(code) not in _ASCII_KEEP}
+
+COMPILED_ENTITY_PATTERNS: Dict[str, List[re.Pattern]] = {
+    entity_type: [re.compile(pattern, re.IGNORECASE) for pattern in pattern_list]
+    for entity_type, pattern_list in ENTITY_PATTERNS.items()
+}
 
 
-def extract_text_from_image(image_path: str) -> str:
+# ASCII separators that Python's \s matches but Hyperscan's does not
+_EXTRA_ASCII_SPACES = {code: ' ' for code in range(0x1c, 0x20)}
+
+
+def build_prefilter(patterns: Dict[Hashable, re.Pattern]) -> Optional[Callable[[str], Optional[Set[Hashable]]]]:
     """
-    Extract text from an image using OCR
+    Compile regexes into one Hyperscan database scanned in a single pass
+    
+    Returns a function mapping a text to the keys of the patterns that
+    match somewhere in it, so callers only run the `re` patterns that can
+    produce matches. Results are therefore identical with and without
+    Hyperscan. The function returns None for non-ASCII text, where
+    Python's Unicode classes and Hyperscan's ASCII ones differ, and when
+    the scan fails. Returns None itself when Hyperscan is not installed or
+    cannot compile the patterns.
     """
+    if hyperscan is None or not patterns:
+        return None
+    
+    keys = list(patterns)
     try:
-        # Read image using OpenCV
-        image = cv2.imread(image_path)
-        if image is None:
-            return ""
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Apply noise reduction and sharpening
-        denoised = cv2.fastNlMeansDenoising(gray)
+        database = hyperscan.Database()
+        database.compile(
+            expressions=[patterns[key].pattern.encode('utf-8') for key in keys],
+            ids=list(range(len(keys))),
+            flags=[
+                hyperscan.HS_FLAG_SINGLEMATCH
+                | (hyperscan.HS_FLAG_CASELESS if patterns[key].flags & re.IGNORECASE else 0)
+                for key in keys
+            ]
+        )
+    except Exception as e:
+        print(f"Hyperscan prefilter disabled: {str(e)}")
+        return None
+    
+    # Scratch space is per thread; the compiled database is shared
+    local = threading.local()
+    
+    def matching_keys(text: str) -> Optional[Set[Hashable]]:
+        if not text.isascii():
+            return None
+        matched = set()
         
-        # Use Tesseract for OCR
-        text = pytesseract.image_to_string(denoised, config='--psm 6')
+        def on_match(pattern_id, start, end, flags, context):
+            matched.add(keys[pattern_id])
         
-        return text.strip()
+        try:
+            if not hasattr(local, 'scratch'):
+                local.scratch = hyperscan.Scratch(database)
+            data = text.translate(_EXTRA_ASCII_SPACES).encode('ascii')
+            database.scan(data, match_event_handler=on_match, scratch=local.scratch)
+        except Exception:
+            return None
+        return matched
+    
+    return matching_keys
+
+
+def build_keyword_matcher(keywords: Sequence[Tuple[str, str]]) -> Optional[Callable[[str], Optional[str]]]:
+    """
+    Build an Aho-Corasick automaton over (keyword, label) pairs
+    
+    Returns a function that finds every keyword in a text with a single
+    pass and returns the label of the earliest pair in `keywords` that
+    matched, or None. This is the same answer as testing the pairs in
+    order with `in`. Returns None itself when pyahocorasick is not
+    installed.
+    """
+    if ahocorasick is None or not keywords:
+        return None
+    
+    automaton = ahocorasick.Automaton()
+    for priority, (keyword, label) in enumerate(keywords):
+        if keyword not in automaton:
+            automaton.add_word(keyword, (priority, label))
+    automaton.make_automaton()
+    
+    def first_label(text: str) -> Optional[str]:
+        best = None
+        for _, match in automaton.iter(text):
+            if best is None or match[0] < best[0]:
+                best = match
+                if best[0] == 0:
+                    break
+        return best[1] if best else None
+    
+    return first_label
+
+
+_ENTITY_PREFILTER = build_prefilter({
+    (entity_type, i): pattern
+    for entity_type, pattern_list in COMPILED_ENTITY_PATTERNS.items()
+    for i, pattern in enumerate(pattern_list)
+})
+
+# Warm Tesseract APIs; the C++ API is not thread-safe, so each one is
+# lent to a single caller at a time and returned to the pool afterwards
+_tesseract_pool: "queue.Queue[PyTessBaseAPI]" = queue.Queue()
+
+
+@contextmanager
+def _tesseract_api() -> Iterator[PyTessBaseAPI]:
+    """
+    Borrow a Tesseract API from the pool, creating one if none is free
+    """
+    try:
+        api = _tesseract_pool.get_nowait()
+    except queue.Empty:
+        api = PyTessBaseAPI(psm=PSM.SINGLE_BLOCK)
+        atexit.register(api.End)
+    try:
+        yield api
+    finally:
+        _tesseract_pool.put(api)
+
+
+def extract_text_from_image(image_path: str, quality: str = 'fast') -> str:
+    """
+    Extract text from an image using OCR
+    
+    quality='high' swaps the median filter for non-local means denoising,
+    which is far slower and rarely changes the OCR output.
+    """
+    try:
+        # Decode straight to grayscale; avoids a full-size BGR buffer and a
+        # separate color conversion pass
+        gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            return ""
+        return _ocr_grayscale(gray, quality)
         
     except Exception as e:
         print(f"Error extracting text from {image_path}: {str(e)}")
         return ""
 
 
+def extract_text_from_bytes(buf: bytes, quality: str = 'fast') -> str:
+    """
+    Extract text from an encoded image held in memory using OCR
+    
+    Same as extract_text_from_image, for uploads that never touch disk.
+    """
+    try:
+        gray = cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            return ""
+        return _ocr_grayscale(gray, quality)
+        
+    except Exception as e:
+        print(f"Error extracting text from image bytes: {str(e)}")
+        return ""
+
+
+def _ocr_grayscale(gray: np.ndarray, quality: str) -> str:
+    """
+    Downscale, denoise and OCR a grayscale image
+    """
+    # Tesseract's runtime scales with pixel count; cap the long side
+    scale = OCR_MAX_DIMENSION / max(gray.shape)
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    
+    # Apply noise reduction
+    if quality == 'high':
+        gray = cv2.fastNlMeansDenoising(gray)
+    else:
+        cv2.medianBlur(gray, 3, dst=gray)
+    
+    # Use Tesseract for OCR
+    with _tesseract_api() as api:
+        api.SetImage(Image.fromarray(gray))
+        text = api.GetUTF8Text()
+    
+    return text.strip()
+
+
 def clean_text(text: str) -> str:
     """
     Clean and normalize extracted text
@@ -46,29 +232,42 @@ def clean_text(text: str) -> str:
         return ""
     
     # Remove excessive whitespace
-    text = re.sub(r'\s+', ' ', text)
-    
-    # Remove special characters but keep punctuation
-    text = re.sub(r'[^\w\s.,!?;:()\-$@]', '', text)
+    text = _WHITESPACE_RE.sub(' ', text)
     
-    # Remove very short lines (likely OCR artifacts)
-    lines = text.split('\n')
-    lines = [line.strip() for line in lines if len(line.strip()) > 2]
+    # Remove special characters but keep punctuation; a single C-level
+    # pass for ASCII text, the regex for Unicode word characters
+    if text.isascii():
+        text = text.translate(_ASCII_STRIP)
+    else:
+        text = _SPECIAL_RE.sub('', text)
     
-    return ' '.join(lines).strip()
+    # Whitespace is already collapsed to single spaces, so the text is one
+    # line; drop it if it is too short to be more than an OCR artifact
+    text = text.strip()
+    return text if len(text) > 2 else ""
 
 
-def extract_entities(text: str, patterns: Dict[str, List[str]]) -> Dict[str, List[str]]:
+def extract_entities(text: str, patterns: Optional[Dict[str, List[re.Pattern]]] = None) -> Dict[str, List[str]]:
     """
-    Extract entities from text using regex patterns
+    Extract entities from text using compiled regex patterns
+    
+    Defaults to COMPILED_ENTITY_PATTERNS, built from config.ENTITY_PATTERNS.
     """
+    candidates = None
+    if patterns is None:
+        patterns = COMPILED_ENTITY_PATTERNS
+        if _ENTITY_PREFILTER:
+            candidates = _ENTITY_PREFILTER(text)
+    
     entities = {}
     
     for entity_type, pattern_list in patterns.items():
         matches = []
-        for pattern in pattern_list:
-            found = re.findall(pattern, text, re.IGNORECASE)
-            matches.extend(found)
+        for i, pattern in enumerate(pattern_list):
+            # Skip patterns the prefilter proved cannot match
+            if candidates is not None and (entity_type, i) not in candidates:
+                continue
+            matches.extend(pattern.findall(text))
         
         if matches:
             # Remove duplicates while preserving order
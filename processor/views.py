@@ -15,7 +15,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
 
-from .pipeline import DocumentPipeline
+from .pipeline import get_pipeline
 from .config import DATA_PATH
 
 logger = logging.getLogger(__name__)
@@ -28,10 +28,6 @@ class DocumentUploadView(APIView):
     """
     parser_classes = (MultiPartParser, FormParser)
     
-    def __init__(self):
-        super().__init__()
-        self.pipeline = DocumentPipeline()
-    
     def post(self, request):
         """
         Process a uploaded document file
@@ -59,61 +55,55 @@ class DocumentUploadView(APIView):
                     'message': 'File must be a JPG/JPEG image and less than 10MB'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Save file temporarily
-            temp_path = self._save_temp_file(uploaded_file)
+            import time
+            start_time = time.time()
+            
+            # Process the document straight from memory; validation caps
+            # uploads at 10MB
+            doc_data = get_pipeline().process_single_document(
+                uploaded_file.name, content=uploaded_file.read()
+            )
+            
+            if not doc_data:
+                return Response({
+                    'error': 'Processing failed',
+                    'message': 'Could not extract meaningful text from the document'
+                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            
+            processing_time = round(time.time() - start_time, 2)
+            
+            # Calculate confidence based on text quality and entity extraction
+            confidence = self._calculate_confidence(doc_data)
+            
+            # Prepare structured JSON response as required by ML project
+            response_data = {
+                'success': True,
+                'document_type': doc_data['category'],
+                'confidence': confidence,
+                'extracted_entities': {
+                    'persons': doc_data['entities'].get('persons', []),
+                    'organizations': doc_data['entities'].get('organizations', []),
+                    'locations': doc_data['entities'].get('locations', []),
+                    'dates': doc_data['entities'].get('dates', []),
+                    'amounts': doc_data['entities'].get('amounts', []),
+                    'emails': doc_data['entities'].get('emails', []),
+                    'phones': doc_data['entities'].get('phones', []),
+                    'addresses': doc_data['entities'].get('addresses', [])
+                },
+                'metadata': {
+                    'filename': doc_data['filename'],
+                    'word_count': doc_data['word_count'],
+                    'processing_time_seconds': processing_time,
+                    'timestamp': doc_data['timestamp'],
+                    'ocr_method': 'tesseract',
+                    'classification_method': 'rule_based',
+                    'entity_extraction_method': 'bert_ner_llm'
+                },
+                'text_preview': doc_data['text'][:200] + "..." if len(doc_data['text']) > 200 else doc_data['text']
+            }
+            
+            return Response(response_data, status=status.HTTP_200_OK)
             
-            try:
-                import time
-                start_time = time.time()
-                
-                # Process the document using our enhanced pipeline
-                doc_data = self.pipeline.process_single_document(temp_path)
-                
-                if not doc_data:
-                    return Response({
-                        'error': 'Processing failed',
-                        'message': 'Could not extract meaningful text from the document'
-                    }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-                
-                processing_time = round(time.time() - start_time, 2)
-                
-                # Calculate confidence based on text quality and entity extraction
-                confidence = self._calculate_confidence(doc_data)
-                
-                # Prepare structured JSON response as required by ML project
-                response_data = {
-                    'success': True,
-                    'document_type': doc_data['category'],
-                    'confidence': confidence,
-                    'extracted_entities': {
-                        'persons': doc_data['entities'].get('persons', []),
-                        'organizations': doc_data['entities'].get('organizations', []),
-                        'locations': doc_data['entities'].get('locations', []),
-                        'dates': doc_data['entities'].get('dates', []),
-                        'amounts': doc_data['entities'].get('amounts', []),
-                        'emails': doc_data['entities'].get('emails', []),
-                        'phones': doc_data['entities'].get('phones', []),
-                        'addresses': doc_data['entities'].get('addresses', [])
-                    },
-                    'metadata': {
-                        'filename': doc_data['filename'],
-                        'word_count': doc_data['word_count'],
-                        'processing_time_seconds': processing_time,
-                        'timestamp': doc_data['timestamp'],
-                        'ocr_method': 'tesseract',
-                        'classification_method': 'rule_based',
-                        'entity_extraction_method': 'bert_ner_llm'
-                    },
-                    'text_preview': doc_data['text'][:200] + "..." if len(doc_data['text']) > 200 else doc_data['text']
-                }
-                
-                return Response(response_data, status=status.HTTP_200_OK)
-                
-            finally:
-                # Clean up temp file
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-                    
         except Exception as e:
             logger.error(f"Error processing upload: {str(e)}")
             return Response({
@@ -126,22 +116,21 @@ class DocumentUploadView(APIView):
         confidence = 0.5  # Base confidence
         
         # Add confidence based on text length
-        text_length = len(doc_data.get('text', ''))
+        text_length = len(doc_data['text'])
         if text_length > 100:
             confidence += 0.2
         if text_length > 500:
             confidence += 0.1
         
         # Add confidence based on entity extraction
-        entities = doc_data.get('entities', {})
-        total_entities = sum(len(entities.get(key, [])) for key in entities)
+        total_entities = sum(map(len, doc_data['entities'].values()))
         if total_entities > 0:
             confidence += 0.1
         if total_entities > 3:
             confidence += 0.1
         
         # Add confidence based on document type classification
-        if doc_data.get('category', 'unknown') != 'unknown':
+        if doc_data['category'] != 'unknown':
             confidence += 0.1
         
         return min(confidence, 0.95)  # Cap at 95%
@@ -159,20 +148,6 @@ class DocumentUploadView(APIView):
             return False
         
         return True
-    
-    def _save_temp_file(self, uploaded_file) -> str:
-        """Save uploaded file temporarily"""
-        import tempfile
-        
-        # Create temp file with original extension
-        file_ext = os.path.splitext(uploaded_file.name)[1]
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_ext)
-        
-        for chunk in uploaded_file.chunks():
-            temp_file.write(chunk)
-        
-        temp_file.close()
-        return temp_file.name
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -181,10 +156,6 @@ class DocumentSearchView(APIView):
     API endpoint for searching documents using semantic similarity
     """
     
-    def __init__(self):
-        super().__init__()
-        self.pipeline = DocumentPipeline()
-    
     def get(self, request):
         """
         Search documents in the vector database
@@ -207,7 +178,7 @@ class DocumentSearchView(APIView):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # Perform search
-            results = self.pipeline.search(query, n_results=limit)
+            results = get_pipeline().search(query, n_results=limit)
             
             return Response({
                 'query': query,
@@ -237,9 +208,8 @@ class StatsView(APIView):
         - JSON response with document statistics
         """
         try:
-            # Initialize pipeline only when needed to avoid startup errors
-            pipeline = DocumentPipeline()
-            stats = pipeline.get_stats()
+            # Pipeline is created lazily on first use to avoid startup errors
+            stats = get_pipeline().get_stats()
             return Response(stats, status=status.HTTP_200_OK)
             
         except Exception as e:
@@ -0,0 +1,15 @@
+"""
+Configuration shared by the standalone pipeline and the Django app
+"""
+
+# ChromaDB collection opened by both pipelines, so either one creates it
+# with the same distance space and HNSW settings.
+# Embeddings are normalized, so cosine distance maps cleanly to similarity.
+# HNSW parameters only take effect when the collection is first created.
+COLLECTION_NAME = "documents"
+COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:construction_ef": 200,
+    "hnsw:M": 32,
+    "hnsw:search_ef": 64,
+}